@@ -9,6 +9,7 @@ import os
 SECRET_KEY = os.environ.get('SECRET_KEY', 'vstore-club-secret-key-change-in-production')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 7
+OPERATOR_USER_IDS = {i.strip() for i in os.environ.get('OPERATOR_USER_IDS', '').split(',') if i.strip()}
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
@@ -59,3 +60,12 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         raise credentials_exception
     
     return user_id
+
+
+async def get_current_operator(user_id: str = Depends(get_current_user)):
+    if user_id not in OPERATOR_USER_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Operator access required",
+        )
+    return user_id
@@ -0,0 +1,282 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import uuid
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+logger = logging.getLogger("vstore-backend.inventory")
+
+RESERVATION_TTL = timedelta(minutes=10)
+
+# Per-checkout limits so one account can't lock up a hot SKU during a sale.
+MAX_UNITS_PER_ITEM = 5
+MAX_ACTIVE_RESERVATIONS = 2
+
+# A crashed release is picked up again by the sweeper after this long.
+RELEASE_RETRY = timedelta(minutes=1)
+
+ACTIVE_STATUSES = ["pending", "held"]
+
+
+class InsufficientStock(Exception):
+    def __init__(self, items: List[dict]):
+        super().__init__("Insufficient stock")
+        self.items = items
+
+
+class InvalidItems(Exception):
+    def __init__(self, items: List[dict]):
+        super().__init__("Invalid items")
+        self.items = items
+
+
+class ReservationLimitExceeded(Exception):
+    pass
+
+
+def _merge_items(items: Iterable[dict]) -> Dict[Tuple[str, str], int]:
+    merged: Dict[Tuple[str, str], int] = {}
+    for item in items:
+        key = (item["productId"], item["selectedSize"])
+        merged[key] = merged.get(key, 0) + item["quantity"]
+    return merged
+
+
+def _stock_items(merged: Dict[Tuple[str, str], int]) -> List[dict]:
+    return [
+        {"productId": product_id, "selectedSize": size, "quantity": quantity}
+        for (product_id, size), quantity in merged.items()
+    ]
+
+
+def _hold_field(reservation_id: str, size: str) -> str:
+    return f"holds.{reservation_id}.{size}"
+
+
+async def _tracked_items(products_collection, merged: Dict[Tuple[str, str], int]) -> Dict[Tuple[str, str], int]:
+    """Validate items against their products and keep the inventory-tracked ones.
+
+    Raises ``InvalidItems`` for unknown products, sizes the product doesn't
+    list, and quantities outside 1..MAX_UNITS_PER_ITEM. Products without a
+    per-size ``stock`` map are valid but untracked.
+    """
+    product_ids = {ObjectId(product_id) for product_id, _ in merged if ObjectId.is_valid(product_id)}
+    products = {
+        str(p["_id"]): p
+        for p in await products_collection.find(
+            {"_id": {"$in": list(product_ids)}}, {"sizes": 1, "stock": 1}
+        ).to_list(None)
+    }
+
+    invalid = [
+        item for item in _stock_items(merged)
+        if not 0 < item["quantity"] <= MAX_UNITS_PER_ITEM
+        or item["productId"] not in products
+        or item["selectedSize"] not in (products[item["productId"]].get("sizes") or [])
+        or "." in item["selectedSize"]
+        or item["selectedSize"].startswith("$")
+    ]
+    if invalid:
+        raise InvalidItems(invalid)
+
+    return {key: qty for key, qty in merged.items() if isinstance(products[key[0]].get("stock"), dict)}
+
+
+async def _take(products_collection, reservation_id: str, product_id: str, size: str, quantity: int) -> bool:
+    # The hold marker records, on the product itself, that this reservation took
+    # the stock, so giving it back can never happen twice or for stock never taken.
+    hold = _hold_field(reservation_id, size)
+    result = await products_collection.update_one(
+        {"_id": ObjectId(product_id), f"stock.{size}": {"$gte": quantity}, hold: {"$exists": False}},
+        {"$inc": {f"stock.{size}": -quantity}, "$set": {hold: quantity}},
+    )
+    return result.modified_count == 1
+
+
+async def _give_back(products_collection, reservation_id: str, product_id: str, size: str, quantity: int):
+    hold = _hold_field(reservation_id, size)
+    await products_collection.update_one(
+        {"_id": ObjectId(product_id), hold: {"$exists": True}},
+        {"$inc": {f"stock.{size}": quantity}, "$unset": {hold: ""}},
+    )
+
+
+async def reserve_stock(products_collection, reservation_id: str, items: Iterable[dict]) -> List[dict]:
+    """Take stock for every item on behalf of ``reservation_id``, or for none of them.
+
+    Each (product, size) is one conditional update, guarded by
+    ``stock.<size> >= n``, and the updates run concurrently, so checkouts only
+    contend on the product documents they touch. Each update reports whether
+    it applied; if any item is short, the applied ones are given back before
+    raising ``InsufficientStock``. Returns the inventory-tracked items taken.
+    """
+    merged = await _tracked_items(products_collection, _merge_items(items))
+    if not merged:
+        return []
+
+    keys = list(merged)
+    results = await asyncio.gather(
+        *(_take(products_collection, reservation_id, product_id, size, merged[(product_id, size)])
+          for product_id, size in keys),
+        return_exceptions=True,
+    )
+    if all(r is True for r in results):
+        return _stock_items(merged)
+
+    applied = {key: merged[key] for key, r in zip(keys, results) if r is True}
+    await release_stock(products_collection, reservation_id, _stock_items(applied))
+
+    for r in results:
+        if isinstance(r, BaseException):
+            raise r
+    raise InsufficientStock(_stock_items({key: merged[key] for key, r in zip(keys, results) if r is False}))
+
+
+async def release_stock(products_collection, reservation_id: str, items: Iterable[dict]):
+    """Give back whatever stock ``reservation_id`` still holds for ``items``. Safe to repeat."""
+    await asyncio.gather(*(
+        _give_back(products_collection, reservation_id, product_id, size, qty)
+        for (product_id, size), qty in _merge_items(items).items()
+    ))
+
+
+async def create_reservation(
+    products_collection,
+    reservations_collection,
+    user_id: str,
+    items: Iterable[dict],
+    ttl: timedelta = RESERVATION_TTL,
+) -> dict:
+    """Hold stock for a checkout until it is committed or ``ttl`` runs out.
+
+    The reservation is written as ``pending`` before any stock is taken, so
+    if this process dies halfway the sweeper still finds it once it expires
+    and gives back whatever it holds.
+    """
+    now = datetime.utcnow()
+    active = await reservations_collection.count_documents(
+        {"userId": user_id, "status": {"$in": ACTIVE_STATUSES}, "expiresAt": {"$gt": now}}
+    )
+    if active >= MAX_ACTIVE_RESERVATIONS:
+        raise ReservationLimitExceeded()
+
+    reservation = {
+        "_id": f"RES{uuid.uuid4().hex[:12].upper()}",
+        "userId": user_id,
+        "items": _stock_items(_merge_items(items)),
+        "status": "pending",
+        "createdAt": now,
+        "expiresAt": now + ttl,
+    }
+    await reservations_collection.insert_one(reservation)
+
+    try:
+        await reserve_stock(products_collection, reservation["_id"], reservation["items"])
+    except (InsufficientStock, InvalidItems):
+        # Nothing is held any more; anything else is left for the sweeper.
+        await reservations_collection.update_one(
+            {"_id": reservation["_id"], "status": "pending"},
+            {"$set": {"status": "released", "releasedAt": datetime.utcnow()}},
+        )
+        raise
+
+    result = await reservations_collection.update_one(
+        {"_id": reservation["_id"], "status": "pending"},
+        {"$set": {"status": "held"}},
+    )
+    if result.modified_count != 1:
+        raise RuntimeError(f"Reservation {reservation['_id']} was released while reserving")
+    reservation["status"] = "held"
+    return reservation
+
+
+async def commit_reservation(reservations_collection, reservation_id: str, user_id: str, session=None) -> Optional[dict]:
+    """Mark a live reservation as used by an order. Returns None if it expired or doesn't exist."""
+    return await reservations_collection.find_one_and_update(
+        {
+            "_id": reservation_id,
+            "userId": user_id,
+            "status": "held",
+            "expiresAt": {"$gt": datetime.utcnow()},
+        },
+        {"$set": {"status": "committed", "committedAt": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+
+
+def reservation_matches(reservation: dict, items: Iterable[dict]) -> bool:
+    return _merge_items(reservation["items"]) == _merge_items(items)
+
+
+async def clear_reservation_holds(products_collection, reservations_collection, reservation_id: str):
+    """Drop the hold markers of a committed reservation; its stock stays taken."""
+    reservation = await reservations_collection.find_one({"_id": reservation_id, "status": "committed"})
+    if not reservation:
+        return
+    product_ids = {ObjectId(item["productId"]) for item in reservation["items"] if ObjectId.is_valid(item["productId"])}
+    await products_collection.update_many(
+        {"_id": {"$in": list(product_ids)}},
+        {"$unset": {f"holds.{reservation_id}": ""}},
+    )
+
+
+async def _release(products_collection, reservations_collection, reservation: dict):
+    await release_stock(products_collection, reservation["_id"], reservation["items"])
+    await reservations_collection.update_one(
+        {"_id": reservation["_id"], "status": "releasing"},
+        {"$set": {"status": "released", "releasedAt": datetime.utcnow()}},
+    )
+
+
+async def cancel_reservation(products_collection, reservations_collection, query: dict) -> bool:
+    """Release one active reservation matching ``query``, expired or not.
+
+    Moving it to ``releasing`` first means a concurrent commit (which needs
+    ``held``) can no longer succeed, and the reservation only becomes
+    ``released`` once its stock is actually back.
+    """
+    reservation = await reservations_collection.find_one_and_update(
+        {**query, "status": {"$in": ACTIVE_STATUSES}},
+        {"$set": {"status": "releasing", "releasingAt": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not reservation:
+        return False
+    await _release(products_collection, reservations_collection, reservation)
+    return True
+
+
+async def release_expired_reservations(products_collection, reservations_collection) -> int:
+    """Release expired reservations, including releases a crashed process left unfinished."""
+    released = 0
+    while True:
+        now = datetime.utcnow()
+        reservation = await reservations_collection.find_one_and_update(
+            {"$or": [
+                {"status": {"$in": ACTIVE_STATUSES}, "expiresAt": {"$lte": now}},
+                {"status": "releasing", "releasingAt": {"$lte": now - RELEASE_RETRY}},
+            ]},
+            {"$set": {"status": "releasing", "releasingAt": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if not reservation:
+            return released
+        await _release(products_collection, reservations_collection, reservation)
+        released += 1
+
+
+async def run_reservation_sweeper(products_collection, reservations_collection, interval: float = 30.0):
+    while True:
+        try:
+            released = await release_expired_reservations(products_collection, reservations_collection)
+            if released:
+                logger.info(f"Released {released} expired reservations")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Reservation sweeper error: {e}")
+        await asyncio.sleep(interval)
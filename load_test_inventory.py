@@ -0,0 +1,122 @@
+import asyncio
+import os
+import time
+import uuid
+from datetime import timedelta
+
+from inventory import (
+    InsufficientStock,
+    cancel_reservation,
+    clear_reservation_holds,
+    commit_reservation,
+    create_reservation,
+    release_expired_reservations,
+)
+
+
+async def run_load_test(
+    client,
+    db,
+    checkouts: int = 5000,
+    stock: int = 1000,
+    concurrency: int = 200,
+    min_throughput: float = 300.0,
+):
+    """Hammer one hot SKU with concurrent checkouts and check nothing oversells.
+
+    Uses throwaway collections so it can be pointed at a dev database (a
+    replica set, since orders commit in a transaction). Every checkout
+    reserves one unit of the hot SKU plus one unit of a second SKU, then:
+    one in ten cancels, one in ten is abandoned and left for the sweeper,
+    and the rest commit their reservation in a transaction as create_order
+    does. Fails if stock drifts or throughput drops below ``min_throughput``
+    checkouts per second.
+    """
+    suffix = uuid.uuid4().hex[:8]
+    products_collection = db[f"loadtest_products_{suffix}"]
+    reservations_collection = db[f"loadtest_reservations_{suffix}"]
+
+    result = await products_collection.insert_many([
+        {"name": "Hot SKU", "sizes": ["M"], "stock": {"M": stock}},
+        {"name": "Side SKU", "sizes": ["L"], "stock": {"L": checkouts}},
+    ])
+    hot_id, side_id = (str(i) for i in result.inserted_ids)
+    items = [
+        {"productId": hot_id, "selectedSize": "M", "quantity": 1},
+        {"productId": side_id, "selectedSize": "L", "quantity": 1},
+    ]
+
+    semaphore = asyncio.Semaphore(concurrency)
+    outcome = {"reserved": 0, "rejected": 0, "cancelled": 0, "abandoned": 0, "committed": 0}
+
+    async def checkout(n: int):
+        user_id = f"user{n}"
+        abandoned = n % 10 == 1
+        async with semaphore:
+            try:
+                reservation = await create_reservation(
+                    products_collection,
+                    reservations_collection,
+                    user_id,
+                    items,
+                    ttl=timedelta(0) if abandoned else timedelta(minutes=10),
+                )
+            except InsufficientStock:
+                outcome["rejected"] += 1
+                return
+            outcome["reserved"] += 1
+
+            if abandoned:
+                outcome["abandoned"] += 1
+            elif n % 10 == 0:
+                await cancel_reservation(products_collection, reservations_collection, {"_id": reservation["_id"]})
+                outcome["cancelled"] += 1
+            else:
+                async def commit(session):
+                    return await commit_reservation(reservations_collection, reservation["_id"], user_id, session=session)
+
+                async with await client.start_session() as session:
+                    assert await session.with_transaction(commit), "live reservation failed to commit"
+                await clear_reservation_holds(products_collection, reservations_collection, reservation["_id"])
+                outcome["committed"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(checkout(n) for n in range(checkouts)))
+    elapsed = time.perf_counter() - started
+
+    swept = await release_expired_reservations(products_collection, reservations_collection)
+
+    hot = await products_collection.find_one({"name": "Hot SKU"})
+    side = await products_collection.find_one({"name": "Side SKU"})
+    throughput = checkouts / elapsed
+
+    await products_collection.drop()
+    await reservations_collection.drop()
+
+    print(f"{checkouts} checkouts in {elapsed:.2f}s ({throughput:.0f}/s), concurrency {concurrency}")
+    print(", ".join(f"{k}={v}" for k, v in outcome.items()) + f", swept={swept}")
+    print(f"hot stock left={hot['stock']['M']} side stock left={side['stock']['L']}")
+
+    assert swept == outcome["abandoned"], "sweeper missed abandoned reservations"
+    assert hot["stock"]["M"] >= 0, "hot SKU oversold"
+    assert hot["stock"]["M"] == stock - outcome["committed"], "hot SKU stock does not match committed orders"
+    assert side["stock"]["L"] == checkouts - outcome["committed"], "compensation leaked side SKU stock"
+    assert outcome["reserved"] >= min(stock, checkouts), "rejected checkouts while stock was available"
+    assert throughput >= min_throughput, f"throughput {throughput:.0f}/s below {min_throughput:.0f}/s"
+
+
+if __name__ == "__main__":
+    # Run against a dev database: python load_test_inventory.py
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from dotenv import load_dotenv
+    from pathlib import Path
+
+    ROOT_DIR = Path(__file__).parent
+    load_dotenv(ROOT_DIR / '.env')
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        await run_load_test(client, client[os.environ['DB_NAME']])
+        client.close()
+
+    asyncio.run(main())
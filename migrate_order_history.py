@@ -0,0 +1,61 @@
+import asyncio
+import os
+
+
+async def migrate_order_history(client, db):
+    """One-off migration for orders written before createdAt/itemCount existed.
+
+    Each legacy order is stamped from its ObjectId creation time and item
+    list and counted in its user's summary, in one transaction per order.
+    The stamp is conditional on createdAt still being missing, so reruns and
+    concurrent runs never count an order twice, and summaries are only
+    incremented, never replaced.
+    """
+    from order_history import record_order_summary
+
+    orders_collection = db.orders
+    summaries_collection = db.order_summaries
+    migrated = 0
+
+    async for legacy in orders_collection.find({"createdAt": {"$exists": False}}, {"_id": 1}):
+        async def migrate(session):
+            created_at = legacy["_id"].generation_time.replace(tzinfo=None)
+            order = await orders_collection.find_one_and_update(
+                {"_id": legacy["_id"], "createdAt": {"$exists": False}},
+                {"$set": {"createdAt": created_at, "updatedAt": created_at}},
+                session=session,
+            )
+            if not order:
+                return False
+            await orders_collection.update_one(
+                {"_id": order["_id"]},
+                {"$set": {"itemCount": sum(item["quantity"] for item in order.get("items", []))}},
+                session=session,
+            )
+            order["createdAt"] = created_at
+            await record_order_summary(summaries_collection, order, session=session)
+            return True
+
+        async with await client.start_session() as session:
+            if await session.with_transaction(migrate):
+                migrated += 1
+
+    print(f"Migrated {migrated} legacy orders")
+    return migrated
+
+
+if __name__ == "__main__":
+    # Run once after deploying order history, once no old instance is still writing orders
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from dotenv import load_dotenv
+    from pathlib import Path
+
+    ROOT_DIR = Path(__file__).parent
+    load_dotenv(ROOT_DIR / '.env')
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        await migrate_order_history(client, client[os.environ['DB_NAME']])
+        client.close()
+
+    asyncio.run(main())
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, EmailStr, conint
+from typing import Dict, List, Optional
 from datetime import datetime
 from bson import ObjectId
 
@@ -36,6 +36,7 @@ class Product(BaseModel):
     rating: float
     reviews: int
     inStock: bool = True
+    stock: Optional[Dict[str, int]] = None
     freeDelivery: bool = True
     deliveryDays: int
     createdAt: Optional[datetime] = Field(default_factory=datetime.utcnow)
@@ -63,7 +64,7 @@ class User(BaseModel):
 class CartItem(BaseModel):
     productId: str
     selectedSize: str
-    quantity: int
+    quantity: conint(gt=0)
 
 
 class Cart(BaseModel):
@@ -103,7 +104,7 @@ class OrderItem(BaseModel):
     productName: str
     productImage: str
     selectedSize: str
-    quantity: int
+    quantity: conint(gt=0)
     price: float
 
 
@@ -165,6 +166,10 @@ class AddToWishlistRequest(BaseModel):
     productId: str
 
 
+class ReserveStockRequest(BaseModel):
+    items: List[CartItem]
+
+
 class CreateOrderRequest(BaseModel):
     items: List[OrderItem]
     shippingAddress: ShippingAddress
@@ -172,3 +177,4 @@ class CreateOrderRequest(BaseModel):
     subtotal: float
     deliveryCharge: float
     totalAmount: float
+    reservationId: Optional[str] = None
@@ -0,0 +1,56 @@
+from typing import Optional
+from datetime import datetime
+from bson import ObjectId
+
+
+async def record_order_summary(summaries_collection, order: dict, session=None):
+    """Count ``order`` in its user's summary document.
+
+    Call this in the same transaction that writes the order, so the summary
+    can never miss or double count one.
+    """
+    await summaries_collection.update_one(
+        {"userId": order["userId"]},
+        {
+            "$inc": {"orderCount": 1, "lifetimeSpend": order["totalAmount"]},
+            "$max": {"lastOrderAt": order["createdAt"]},
+        },
+        upsert=True,
+        session=session,
+    )
+    # Only move lastOrder forward, so a slower concurrent insert can't overwrite a newer one.
+    await summaries_collection.update_one(
+        {"userId": order["userId"], "lastOrderAt": order["createdAt"]},
+        {"$set": {"lastOrder": {
+            "orderId": order["orderId"],
+            "totalAmount": order["totalAmount"],
+            "status": order["status"],
+            "createdAt": order["createdAt"],
+        }}},
+        session=session,
+    )
+
+
+def encode_order_cursor(order: dict) -> str:
+    # Orders written by an older deploy may lack createdAt; they sort after every dated order.
+    created_at = order.get("createdAt")
+    return f"{created_at.isoformat() if created_at else ''}_{order['_id']}"
+
+
+def decode_order_cursor(cursor: str):
+    """Parse a cursor into (createdAt or None, ObjectId). Raises ValueError if malformed."""
+    created_at, order_oid = cursor.rsplit("_", 1)
+    if not ObjectId.is_valid(order_oid):
+        raise ValueError("Invalid order id in cursor")
+    return (datetime.fromisoformat(created_at) if created_at else None), ObjectId(order_oid)
+
+
+def order_cursor_query(created_at: Optional[datetime], order_oid: ObjectId) -> dict:
+    """Filter for orders after the cursor in (createdAt desc, _id desc) order."""
+    if created_at is None:
+        return {"createdAt": None, "_id": {"$lt": order_oid}}
+    return {"$or": [
+        {"createdAt": {"$lt": created_at}},
+        {"createdAt": created_at, "_id": {"$lt": order_oid}},
+        {"createdAt": None},
+    ]}
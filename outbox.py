@@ -0,0 +1,196 @@
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import uuid
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger("vstore-backend.outbox")
+
+OutboxHandler = Callable[[dict], Awaitable[None]]
+
+
+def outbox_event(event_type: str, payload: dict) -> dict:
+    """Build an outbox document. Insert it in the same transaction as the change it describes."""
+    now = datetime.utcnow()
+    return {
+        "type": event_type,
+        "payload": payload,
+        "status": "pending",
+        "attempts": 0,
+        "availableAt": now,
+        "lockedUntil": None,
+        "lastError": None,
+        "createdAt": now,
+    }
+
+
+class OutboxWorker:
+    """Drains the outbox collection with a pool of asyncio workers.
+
+    Each worker claims up to ``batch_size`` due events in one ``update_many``
+    tagged with a claim token, runs their handlers with at most
+    ``concurrency`` in flight across the pool, and writes the results back in
+    one bulk write. Handlers that exceed ``handler_timeout`` count as failed.
+    Failed events are retried with exponential backoff until ``max_attempts``
+    is reached. Claims carry a lease, so events held by a crashed process are
+    picked up again.
+    """
+
+    def __init__(
+        self,
+        collection,
+        workers: int = 2,
+        batch_size: int = 20,
+        concurrency: int = 10,
+        poll_interval: float = 1.0,
+        lease: timedelta = timedelta(minutes=5),
+        handler_timeout: float = 60.0,
+        max_attempts: int = 8,
+        base_backoff: float = 2.0,
+        max_backoff: float = 600.0,
+    ):
+        self.collection = collection
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        if handler_timeout >= lease.total_seconds():
+            raise ValueError("handler_timeout must be shorter than the lease")
+        self.lease = lease
+        self.handler_timeout = handler_timeout
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.handlers: Dict[str, OutboxHandler] = {}
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+
+    def register(self, event_type: str, handler: OutboxHandler):
+        self.handlers[event_type] = handler
+
+    def notify(self):
+        """Wake idle workers so a fresh event doesn't wait for the next poll."""
+        self._wakeup.set()
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def metrics(self) -> dict:
+        now = datetime.utcnow()
+        oldest = await self.collection.find_one(
+            {"status": {"$in": ["pending", "processing"]}},
+            {"createdAt": 1},
+            sort=[("createdAt", 1)],
+        )
+        return {
+            "pending": await self.collection.count_documents({"status": "pending"}),
+            "processing": await self.collection.count_documents({"status": "processing"}),
+            "dead": await self.collection.count_documents({"status": "failed"}),
+            "lagSeconds": (now - oldest["createdAt"]).total_seconds() if oldest else 0.0,
+            "processed": self.processed,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                batch = await self._claim_batch()
+                if batch:
+                    await self._process_batch(batch)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox worker error: {e}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim_batch(self):
+        now = datetime.utcnow()
+        due = {"$or": [
+            {"status": "pending", "availableAt": {"$lte": now}},
+            {"status": "processing", "lockedUntil": {"$lte": now}},
+        ]}
+        candidates = await (
+            self.collection.find(due, {"_id": 1})
+            .sort("availableAt", 1)
+            .limit(self.batch_size)
+            .to_list(self.batch_size)
+        )
+        if not candidates:
+            return []
+
+        # Re-checking `due` in the update means events another worker
+        # claimed in the meantime are skipped rather than taken twice.
+        token = uuid.uuid4().hex
+        await self.collection.update_many(
+            {"_id": {"$in": [c["_id"] for c in candidates]}, **due},
+            {"$set": {"status": "processing", "lockedUntil": now + self.lease, "claimToken": token}},
+        )
+        return await self.collection.find({"claimToken": token}).to_list(self.batch_size)
+
+    async def _process_batch(self, batch):
+        results = await asyncio.gather(*(self._handle(event) for event in batch))
+        updates = [self._result_update(event, error) for event, error in zip(batch, results)]
+        await self.collection.bulk_write([op for op, _ in updates], ordered=False)
+
+        # Count only once the outcome is stored, so a failed write doesn't skew the metrics.
+        for _, outcome in updates:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    async def _handle(self, event: dict) -> Optional[str]:
+        handler = self.handlers.get(event["type"])
+        if handler is None:
+            return f"No handler registered for {event['type']}"
+        async with self._semaphore:
+            try:
+                await asyncio.wait_for(handler(event["payload"]), self.handler_timeout)
+            except asyncio.TimeoutError:
+                return f"Handler timed out after {self.handler_timeout}s"
+            except Exception as e:
+                return repr(e)
+        return None
+
+    def _result_update(self, event: dict, error: Optional[str]) -> Tuple[UpdateOne, str]:
+        """Build the write recording a handler result, plus the counter it moves."""
+        if error is None:
+            return UpdateOne(
+                {"_id": event["_id"], "claimToken": event["claimToken"]},
+                {"$set": {"status": "done", "lockedUntil": None, "processedAt": datetime.utcnow()}},
+            ), "processed"
+
+        attempts = event["attempts"] + 1
+        if attempts >= self.max_attempts:
+            logger.error(f"Outbox event {event['_id']} ({event['type']}) failed permanently: {error}")
+            return UpdateOne(
+                {"_id": event["_id"], "claimToken": event["claimToken"]},
+                {"$set": {"status": "failed", "attempts": attempts, "lockedUntil": None, "lastError": error}},
+            ), "failed"
+
+        delay = min(self.base_backoff * 2 ** (attempts - 1), self.max_backoff)
+        return UpdateOne(
+            {"_id": event["_id"], "claimToken": event["claimToken"]},
+            {"$set": {
+                "status": "pending",
+                "attempts": attempts,
+                "availableAt": datetime.utcnow() + timedelta(seconds=delay),
+                "lockedUntil": None,
+                "lastError": error,
+            }},
+        ), "retried"
@@ -0,0 +1,318 @@
+from typing import Dict, List, Optional, Sequence, Set
+from datetime import datetime
+import asyncio
+import logging
+import time
+
+import numpy as np
+from pymongo import UpdateOne
+
+logger = logging.getLogger("vstore-backend.recommendations")
+
+RELATED_TOP_K = 8
+
+# Seconds between full rebuilds, which also pick up products added since.
+RELATED_REBUILD_INTERVAL = 6 * 3600
+
+# Rows of the similarity matrix computed per batch. Each batch holds the
+# float32 similarities plus argpartition's int64 indices, so peak memory is
+# roughly BATCH_SIZE * catalog_size * 12 bytes (~155MB for a 100k catalog).
+BATCH_SIZE = 128
+
+# Relative weight of each feature block before the row is L2-normalised.
+FEATURE_WEIGHTS = {
+    "category": 3.0,
+    "fabric": 1.5,
+    "colors": 1.0,
+    "sizes": 0.5,
+    "price": 1.5,
+    "rating": 0.5,
+    "discount": 0.5,
+}
+
+PRODUCT_FEATURE_PROJECTION = {
+    "category": 1,
+    "fabric": 1,
+    "colors": 1,
+    "sizes": 1,
+    "price": 1,
+    "rating": 1,
+    "discount": 1,
+}
+
+
+def _vocabulary(products: Sequence[dict], field: str, multi: bool) -> Dict[str, int]:
+    values = set()
+    for product in products:
+        value = product.get(field)
+        if multi:
+            values.update(value or [])
+        elif value is not None:
+            values.add(value)
+    return {value: i for i, value in enumerate(sorted(values))}
+
+
+def _encode(products: Sequence[dict], field: str, multi: bool) -> np.ndarray:
+    vocab = _vocabulary(products, field, multi)
+    block = np.zeros((len(products), max(len(vocab), 1)), dtype=np.float32)
+    for row, product in enumerate(products):
+        value = product.get(field)
+        if multi:
+            cols = [vocab[v] for v in value or []]
+            if cols:
+                block[row, cols] = 1.0 / np.sqrt(len(cols))
+        elif value is not None:
+            block[row, vocab[value]] = 1.0
+    return block
+
+
+def build_feature_matrix(products: Sequence[dict]) -> np.ndarray:
+    """Turn products into an (n, d) matrix of unit-length feature vectors."""
+    n = len(products)
+
+    price = np.log1p(np.array([p.get("price", 0.0) for p in products], dtype=np.float32))
+    span = price.max() - price.min() if n else 0.0
+    price = (price - price.min()) / span if span > 0 else np.zeros(n, dtype=np.float32)
+
+    rating = np.array([p.get("rating", 0.0) for p in products], dtype=np.float32) / 5.0
+    discount = np.array([p.get("discount", 0) for p in products], dtype=np.float32) / 100.0
+
+    blocks = [
+        _encode(products, "category", multi=False) * FEATURE_WEIGHTS["category"],
+        _encode(products, "fabric", multi=False) * FEATURE_WEIGHTS["fabric"],
+        _encode(products, "colors", multi=True) * FEATURE_WEIGHTS["colors"],
+        _encode(products, "sizes", multi=True) * FEATURE_WEIGHTS["sizes"],
+        price[:, None] * FEATURE_WEIGHTS["price"],
+        rating[:, None] * FEATURE_WEIGHTS["rating"],
+        discount[:, None] * FEATURE_WEIGHTS["discount"],
+    ]
+    matrix = np.hstack(blocks).astype(np.float32)
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def category_groups(products: Sequence[dict]) -> np.ndarray:
+    """Integer label per product, one label per category."""
+    vocab = _vocabulary(products, "category", multi=False)
+    return np.array([vocab.get(p.get("category"), -1) for p in products], dtype=np.int64)
+
+
+def _search_pools(groups: Optional[np.ndarray], n: int, k: int) -> np.ndarray:
+    """Pool label per product: its category, or -1 (whole catalog) if the category is too small."""
+    if groups is None:
+        return np.full(n, -1, dtype=np.int64)
+    labels, inverse, counts = np.unique(groups, return_inverse=True, return_counts=True)
+    return np.where(counts[inverse] > k, groups, -1)
+
+
+def _top_k_in_pool(matrix: np.ndarray, pool: np.ndarray, rows: np.ndarray, k: int):
+    m = len(pool)
+    indices = np.empty((len(rows), k), dtype=np.int64)
+    scores = np.empty((len(rows), k), dtype=np.float32)
+    candidates = matrix[pool]
+
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        sims = matrix[batch] @ candidates.T
+
+        # pool is sorted, so each row's own column (if it is in the pool) is found by bisection.
+        self_cols = np.minimum(np.searchsorted(pool, batch), m - 1)
+        hit = pool[self_cols] == batch
+        sims[np.flatnonzero(hit), self_cols[hit]] = -np.inf
+
+        # Partition at m - k rather than negating, which would copy sims.
+        part = np.argpartition(sims, m - k, axis=1)[:, m - k:]
+        part_scores = np.take_along_axis(sims, part, axis=1)
+        del sims
+        order = np.argsort(-part_scores, axis=1)
+
+        indices[start:start + len(batch)] = pool[np.take_along_axis(part, order, axis=1)]
+        scores[start:start + len(batch)] = np.take_along_axis(part_scores, order, axis=1)
+
+    return indices, scores
+
+
+def top_k_neighbors(
+    matrix: np.ndarray,
+    rows: Optional[np.ndarray] = None,
+    k: int = RELATED_TOP_K,
+    groups: Optional[np.ndarray] = None,
+):
+    """Return (indices, scores) of the k most similar products for each row.
+
+    Similarity is the cosine of the feature vectors, computed as one matrix
+    product per batch of rows. A product is never its own neighbour.
+
+    With ``groups`` (see ``category_groups``) each row is only compared with
+    products of the same category, which carries the heaviest feature weight
+    and so dominates the neighbour lists anyway. That turns one n x n pass
+    into a handful of much smaller ones. Categories with k or fewer products
+    still search the whole catalog.
+    """
+    n = matrix.shape[0]
+    if rows is None:
+        rows = np.arange(n)
+    rows = np.asarray(rows, dtype=np.int64)
+    k = min(k, n - 1)
+    if k <= 0 or len(rows) == 0:
+        return np.empty((len(rows), 0), dtype=np.int64), np.empty((len(rows), 0), dtype=np.float32)
+
+    indices = np.empty((len(rows), k), dtype=np.int64)
+    scores = np.empty((len(rows), k), dtype=np.float32)
+
+    pools = _search_pools(groups, n, k)
+    for label in np.unique(pools[rows]):
+        pool = np.arange(n) if label == -1 else np.flatnonzero(pools == label)
+        selected = np.flatnonzero(pools[rows] == label)
+        indices[selected], scores[selected] = _top_k_in_pool(matrix, pool, rows[selected], k)
+
+    return indices, scores
+
+
+def _best_changed_scores(matrix: np.ndarray, changed: np.ndarray, groups: Optional[np.ndarray], k: int) -> np.ndarray:
+    """Best score any changed product reaches for every row, within that row's search pool."""
+    pools = _search_pools(groups, matrix.shape[0], k)
+    best = np.full(matrix.shape[0], -np.inf, dtype=np.float32)
+    for start in range(0, len(changed), BATCH_SIZE):
+        cols = changed[start:start + BATCH_SIZE]
+        sims = matrix @ matrix[cols].T
+        if groups is not None:
+            same = (pools[:, None] == -1) | (groups[:, None] == groups[cols][None, :])
+            sims[~same] = -np.inf
+        best = np.maximum(best, sims.max(axis=1))
+    return best
+
+
+def _kth_score(related: List[dict], k: int) -> Optional[float]:
+    return related[k - 1]["score"] if len(related) >= k else None
+
+
+def merge_related(
+    stored: List[dict],
+    changed_ids: Set[str],
+    fresh: Dict[str, float],
+    valid_ids: Set[str],
+    k: int = RELATED_TOP_K,
+) -> List[dict]:
+    """Fold fresh scores for changed products into a stored neighbour list.
+
+    Stored entries for changed or no longer existing products are dropped,
+    then ``fresh`` (changed product id -> score) is merged in and the list is
+    cut back to the best k.
+    """
+    merged = [r for r in stored if r["productId"] not in changed_ids and r["productId"] in valid_ids]
+    merged += [{"productId": pid, "score": score} for pid, score in fresh.items()]
+    merged.sort(key=lambda r: r["score"], reverse=True)
+    return merged[:k]
+
+
+async def rebuild_related_products(
+    products_collection,
+    related_collection,
+    product_ids: Optional[List[str]] = None,
+    k: int = RELATED_TOP_K,
+):
+    """Precompute related products and store one document per product.
+
+    With ``product_ids`` only the given (new or changed) products get a fresh
+    neighbour list. Another product's stored list is rewritten only if it
+    already names a changed product or a changed product now scores above its
+    stored k-th entry; everything else is left alone. Without ``product_ids``
+    the full catalog is rebuilt.
+
+    Incremental results are an approximation: stored scores came from the
+    feature space of an earlier build (vocabularies, price range), while the
+    new scores come from the current one. ``run_related_rebuilder`` does a
+    periodic full rebuild to bring every list back onto the same scale.
+
+    The NumPy work runs in a worker thread so the event loop keeps serving.
+    """
+    products = await products_collection.find({}, PRODUCT_FEATURE_PROJECTION).to_list(None)
+    if not products:
+        return 0
+
+    ids = [str(p["_id"]) for p in products]
+    position = {pid: i for i, pid in enumerate(ids)}
+    matrix = await asyncio.to_thread(build_feature_matrix, products)
+    groups = category_groups(products)
+    now = datetime.utcnow()
+
+    if product_ids is None:
+        changed = np.arange(len(ids))
+    else:
+        changed = np.array(sorted({position[pid] for pid in product_ids if pid in position}), dtype=np.int64)
+        if len(changed) == 0:
+            return 0
+
+    indices, scores = await asyncio.to_thread(top_k_neighbors, matrix, changed, k, groups)
+    updates = {
+        ids[row]: [
+            {"productId": ids[j], "score": float(s)}
+            for j, s in zip(indices[i], scores[i])
+        ]
+        for i, row in enumerate(changed)
+    }
+
+    if product_ids is not None:
+        changed_ids = [ids[row] for row in changed]
+        best = await asyncio.to_thread(_best_changed_scores, matrix, changed, groups, k)
+
+        kth = np.full(len(ids), -np.inf, dtype=np.float32)
+        async for doc in related_collection.find({}, {"productId": 1, "kthScore": 1}):
+            row = position.get(doc["productId"])
+            if row is not None and doc.get("kthScore") is not None:
+                kth[row] = doc["kthScore"]
+
+        candidates = best > kth
+        candidates[changed] = False
+        candidate_ids = {ids[row] for row in np.flatnonzero(candidates)}
+        async for doc in related_collection.find({"related.productId": {"$in": changed_ids}}, {"productId": 1}):
+            if doc["productId"] not in updates:
+                candidate_ids.add(doc["productId"])
+
+        pools = _search_pools(groups, len(ids), k)
+        changed_set = set(changed_ids)
+        valid_ids = set(ids)
+        async for doc in related_collection.find({"productId": {"$in": list(candidate_ids)}}):
+            row = position.get(doc["productId"])
+            if row is None:
+                continue
+            row_sims = matrix[changed] @ matrix[row]
+            fresh = {
+                ids[col]: float(row_sims[c])
+                for c, col in enumerate(changed)
+                if col != row and (pools[row] == -1 or groups[col] == groups[row])
+            }
+            updates[doc["productId"]] = merge_related(doc.get("related", []), changed_set, fresh, valid_ids, k)
+
+    ops = [
+        UpdateOne(
+            {"productId": pid},
+            {"$set": {"productId": pid, "related": related, "kthScore": _kth_score(related, k), "updatedAt": now}},
+            upsert=True,
+        )
+        for pid, related in updates.items()
+    ]
+    for start in range(0, len(ops), 1000):
+        await related_collection.bulk_write(ops[start:start + 1000], ordered=False)
+
+    if product_ids is None:
+        await related_collection.delete_many({"productId": {"$nin": ids}})
+
+    return len(updates)
+
+
+async def run_related_rebuilder(products_collection, related_collection, interval: float = RELATED_REBUILD_INTERVAL):
+    """Full rebuild now and then every ``interval`` seconds, picking up products added since."""
+    while True:
+        try:
+            started = time.perf_counter()
+            count = await rebuild_related_products(products_collection, related_collection)
+            logger.info(f"Rebuilt related products for {count} products in {time.perf_counter() - started:.1f}s")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Related products rebuild error: {e}")
+        await asyncio.sleep(interval)
@@ -218,6 +218,10 @@ async def seed_products(products_collection):
         }
     ]
     
+    # Start every size with the same stock count
+    for product in sample_products:
+        product.setdefault("stock", {size: 50 for size in product["sizes"]})
+
     # Insert all products
     result = await products_collection.insert_many(sample_products)
     print(f"Inserted {len(result.inserted_ids)} products into the database")
@@ -240,7 +244,15 @@ if __name__ == "__main__":
         db = client[os.environ['DB_NAME']]
         products_collection = db.products
         
-        await seed_products(products_collection)
+        inserted_ids = await seed_products(products_collection)
+
+        # Give the imported products related lists without waiting for the next full rebuild
+        from recommendations import rebuild_related_products
+        await rebuild_related_products(
+            products_collection,
+            db.related_products,
+            [str(i) for i in inserted_ids],
+        )
         client.close()
     
     asyncio.run(main())
\ No newline at end of file
@@ -1,7 +1,9 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 from typing import Optional
+from datetime import datetime
+import asyncio
 import os
 import logging
 import uuid
@@ -11,13 +13,34 @@ from models import (
     Product, User, Cart, Wishlist, Order,
     SignupRequest, LoginRequest, AuthResponse,
     AddToCartRequest, UpdateCartRequest, RemoveFromCartRequest,
-    AddToWishlistRequest, CreateOrderRequest
+    AddToWishlistRequest, CreateOrderRequest, ReserveStockRequest
 )
 from auth import (
     get_password_hash,
     verify_password,
     create_access_token,
-    get_current_user
+    get_current_user,
+    get_current_operator
+)
+from recommendations import run_related_rebuilder
+from outbox import OutboxWorker, outbox_event
+from order_history import (
+    record_order_summary,
+    encode_order_cursor,
+    decode_order_cursor,
+    order_cursor_query,
+)
+from inventory import (
+    InsufficientStock,
+    InvalidItems,
+    ReservationLimitExceeded,
+    MAX_ACTIVE_RESERVATIONS,
+    create_reservation,
+    commit_reservation,
+    cancel_reservation,
+    clear_reservation_holds,
+    reservation_matches,
+    run_reservation_sweeper,
 )
 
 # ==============================
@@ -46,6 +69,24 @@ users_collection = db.users
 cart_collection = db.cart
 wishlist_collection = db.wishlist
 orders_collection = db.orders
+related_products_collection = db.related_products
+order_summaries_collection = db.order_summaries
+outbox_collection = db.outbox
+reservations_collection = db.reservations
+
+# ==============================
+# Outbox (post-checkout work)
+# ==============================
+outbox_worker = OutboxWorker(outbox_collection)
+
+
+async def handle_order_created(payload: dict):
+    if payload.get("reservationId"):
+        await clear_reservation_holds(products_collection, reservations_collection, payload["reservationId"])
+    logger.info(f"Order {payload['orderId']} confirmed for user {payload['userId']}")
+
+
+outbox_worker.register("order.created", handle_order_created)
 
 # ==============================
 # FastAPI App
@@ -87,7 +128,8 @@ def product_helper(product: dict) -> dict:
         "fabric": product["fabric"],
         "rating": product["rating"],
         "reviews": product["reviews"],
-        "inStock": product.get("inStock", True),
+        "inStock": any(q > 0 for q in product["stock"].values()) if product.get("stock") else product.get("inStock", True),
+        "sizeAvailability": {size: q > 0 for size, q in product["stock"].items()} if product.get("stock") else None,
         "freeDelivery": product.get("freeDelivery", True),
         "deliveryDays": product["deliveryDays"],
     }
@@ -101,6 +143,33 @@ def user_helper(user: dict) -> dict:
         "phone": user["phone"],
     }
 
+
+# List views skip items and shippingAddress; use GET /orders/{order_id} for those.
+ORDER_LIST_PROJECTION = {
+    "orderId": 1,
+    "status": 1,
+    "paymentMethod": 1,
+    "itemCount": 1,
+    "totalAmount": 1,
+    "createdAt": 1,
+}
+
+
+def order_helper(order: dict) -> dict:
+    order["id"] = str(order.pop("_id"))
+    return order
+
+
+def order_summary_helper(summary: Optional[dict]) -> dict:
+    if not summary:
+        return {"orderCount": 0, "lifetimeSpend": 0.0, "lastOrder": None}
+    return {
+        "orderCount": summary["orderCount"],
+        "lifetimeSpend": summary["lifetimeSpend"],
+        "lastOrder": summary.get("lastOrder"),
+    }
+
+
 # ==============================
 # Health Check
 # ==============================
@@ -142,6 +211,21 @@ async def get_product(product_id: str):
 
     return product_helper(product)
 
+
+@api_router.get("/products/{product_id}/related")
+async def get_related_products(product_id: str):
+    if not ObjectId.is_valid(product_id):
+        raise HTTPException(status_code=400, detail="Invalid product ID")
+
+    related = await related_products_collection.find_one({"productId": product_id})
+    if not related:
+        return []
+
+    related_ids = [ObjectId(r["productId"]) for r in related["related"]]
+    products = await products_collection.find({"_id": {"$in": related_ids}}).to_list(len(related_ids))
+    by_id = {str(p["_id"]): p for p in products}
+    return [product_helper(by_id[r["productId"]]) for r in related["related"] if r["productId"] in by_id]
+
 # ==============================
 # Auth
 # ==============================
@@ -211,18 +295,146 @@ async def add_to_wishlist(data: AddToWishlistRequest, user_id: str = Depends(get
     )
     return {"message": "Wishlist updated"}
 
+# ==============================
+# Checkout
+# ==============================
+async def reserve_items(user_id: str, items: list) -> dict:
+    try:
+        return await create_reservation(products_collection, reservations_collection, user_id, items)
+    except InsufficientStock as e:
+        raise HTTPException(status_code=409, detail={"message": "Insufficient stock", "items": e.items})
+    except InvalidItems as e:
+        raise HTTPException(status_code=400, detail={"message": "Invalid items", "items": e.items})
+    except ReservationLimitExceeded:
+        raise HTTPException(
+            status_code=429,
+            detail=f"At most {MAX_ACTIVE_RESERVATIONS} active checkouts per user",
+        )
+
+
+@api_router.post("/checkout/reserve")
+async def reserve_checkout(data: ReserveStockRequest, user_id: str = Depends(get_current_user)):
+    reservation = await reserve_items(user_id, [item.dict() for item in data.items])
+    return {"reservationId": reservation["_id"], "expiresAt": reservation["expiresAt"]}
+
+
+@api_router.delete("/checkout/reserve/{reservation_id}")
+async def cancel_checkout_reservation(reservation_id: str, user_id: str = Depends(get_current_user)):
+    released = await cancel_reservation(
+        products_collection,
+        reservations_collection,
+        {"_id": reservation_id, "userId": user_id},
+    )
+    if not released:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    return {"message": "Reservation released"}
+
+# ==============================
+# Admin
+# ==============================
+@api_router.get("/admin/outbox/metrics")
+async def outbox_metrics(operator_id: str = Depends(get_current_operator)):
+    return await outbox_worker.metrics()
+
 # ==============================
 # Orders
 # ==============================
 @api_router.post("/orders")
 async def create_order(data: CreateOrderRequest, user_id: str = Depends(get_current_user)):
     order_id = f"ORD{uuid.uuid4().hex[:8].upper()}"
-    order = data.dict()
-    order.update({"orderId": order_id, "userId": user_id, "status": "confirmed"})
-    await orders_collection.insert_one(order)
+    now = datetime.utcnow()
+    order = data.dict(exclude={"reservationId"})
+
+    # Without a prior /checkout/reserve call, hold the stock here instead.
+    reservation_id = data.reservationId
+    if reservation_id is None:
+        reservation_id = (await reserve_items(user_id, order["items"]))["_id"]
+
+    order.update({
+        "orderId": order_id,
+        "userId": user_id,
+        "status": "confirmed",
+        "itemCount": sum(item.quantity for item in data.items),
+        "reservationId": reservation_id,
+        "createdAt": now,
+        "updatedAt": now,
+    })
+    event = outbox_event("order.created", {
+        "orderId": order_id,
+        "userId": user_id,
+        "totalAmount": data.totalAmount,
+        "reservationId": reservation_id,
+    })
+
+    # The order, its reservation, its outbox event and the user's summary commit together;
+    # everything else the order triggers runs in the outbox worker after we return.
+    # with_transaction retries the whole callback on transient write conflicts
+    # (e.g. two orders from the same user both updating their summary).
+    async def write_order(session):
+        reservation = await commit_reservation(reservations_collection, reservation_id, user_id, session=session)
+        if not reservation:
+            raise HTTPException(status_code=409, detail="Reservation expired or not found")
+        if not reservation_matches(reservation, order["items"]):
+            raise HTTPException(status_code=409, detail="Order items do not match reservation")
+        await orders_collection.insert_one(order, session=session)
+        await outbox_collection.insert_one(event, session=session)
+        await record_order_summary(order_summaries_collection, order, session=session)
+
+    try:
+        async with await client.start_session() as session:
+            await session.with_transaction(write_order)
+    except Exception:
+        if data.reservationId is None:
+            await cancel_reservation(products_collection, reservations_collection, {"_id": reservation_id})
+        raise
+    outbox_worker.notify()
+
     await cart_collection.update_one({"userId": user_id}, {"$set": {"items": []}})
     return {"orderId": order_id}
 
+
+@api_router.get("/orders")
+async def get_orders(
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    user_id: str = Depends(get_current_user),
+):
+    query = {"userId": user_id}
+    if cursor:
+        try:
+            created_at, order_oid = decode_order_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query.update(order_cursor_query(created_at, order_oid))
+
+    orders = await (
+        orders_collection.find(query, ORDER_LIST_PROJECTION)
+        .sort([("createdAt", -1), ("_id", -1)])
+        .limit(limit + 1)
+        .to_list(limit + 1)
+    )
+    next_cursor = encode_order_cursor(orders[limit - 1]) if len(orders) > limit else None
+
+    response = {"orders": [order_helper(o) for o in orders[:limit]], "nextCursor": next_cursor}
+    if not cursor:
+        summary = await order_summaries_collection.find_one({"userId": user_id})
+        response["summary"] = order_summary_helper(summary)
+    return response
+
+
+@api_router.get("/orders/summary")
+async def get_order_summary(user_id: str = Depends(get_current_user)):
+    summary = await order_summaries_collection.find_one({"userId": user_id})
+    return order_summary_helper(summary)
+
+
+@api_router.get("/orders/{order_id}")
+async def get_order(order_id: str, user_id: str = Depends(get_current_user)):
+    order = await orders_collection.find_one({"orderId": order_id, "userId": user_id})
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return order_helper(order)
+
 # ==============================
 # Register Router
 # ==============================
@@ -234,6 +446,17 @@ app.include_router(api_router)
 @app.on_event("startup")
 async def startup():
     try:
+        await related_products_collection.create_index("productId", unique=True)
+        await related_products_collection.create_index("related.productId")
+        await orders_collection.create_index([("userId", 1), ("createdAt", -1), ("_id", -1)])
+        await orders_collection.create_index("orderId", unique=True)
+        await order_summaries_collection.create_index("userId", unique=True)
+        await outbox_collection.create_index([("status", 1), ("availableAt", 1)])
+        await outbox_collection.create_index("claimToken", sparse=True)
+        await outbox_collection.create_index("processedAt", expireAfterSeconds=7 * 24 * 3600)
+        await reservations_collection.create_index([("status", 1), ("expiresAt", 1)])
+        await reservations_collection.create_index([("userId", 1), ("status", 1)])
+
         count = await products_collection.count_documents({})
         if count == 0:
             from seed_data import seed_products
@@ -242,7 +465,20 @@ async def startup():
     except Exception as e:
         logger.error(f"Startup error: {e}")
 
+    outbox_worker.start()
+    app.state.related_rebuilder = asyncio.create_task(
+        run_related_rebuilder(products_collection, related_products_collection)
+    )
+    app.state.reservation_sweeper = asyncio.create_task(
+        run_reservation_sweeper(products_collection, reservations_collection)
+    )
+
 
 @app.on_event("shutdown")
 async def shutdown():
+    await outbox_worker.stop()
+    app.state.related_rebuilder.cancel()
+    await asyncio.gather(app.state.related_rebuilder, return_exceptions=True)
+    app.state.reservation_sweeper.cancel()
+    await asyncio.gather(app.state.reservation_sweeper, return_exceptions=True)
     client.close()
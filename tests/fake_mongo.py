@@ -0,0 +1,118 @@
+"""Just enough of an async Mongo collection to exercise inventory logic in memory."""
+import copy
+from types import SimpleNamespace
+
+_MISSING = object()
+
+
+def _get(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return _MISSING
+        doc = doc[part]
+    return doc
+
+
+def _matches_value(value, condition):
+    if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+        for op, arg in condition.items():
+            if op == "$exists":
+                if (value is not _MISSING) != arg:
+                    return False
+            elif value is _MISSING:
+                return False
+            elif op == "$gte" and not value >= arg:
+                return False
+            elif op == "$gt" and not value > arg:
+                return False
+            elif op == "$lte" and not value <= arg:
+                return False
+            elif op == "$in" and value not in arg:
+                return False
+        return True
+    return value is not _MISSING and value == condition
+
+
+def matches(doc, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in condition):
+                return False
+        elif not _matches_value(_get(doc, key), condition):
+            return False
+    return True
+
+
+def _set_path(doc, path, value):
+    *parents, leaf = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[leaf] = value
+
+
+def _unset_path(doc, path):
+    *parents, leaf = path.split(".")
+    for part in parents:
+        doc = doc.get(part, {})
+    doc.pop(leaf, None)
+
+
+def apply_update(doc, update):
+    for path, amount in update.get("$inc", {}).items():
+        current = _get(doc, path)
+        _set_path(doc, path, (0 if current is _MISSING else current) + amount)
+    for path, value in update.get("$set", {}).items():
+        _set_path(doc, path, value)
+    for path in update.get("$unset", {}):
+        _unset_path(doc, path)
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs if length is None else self.docs[:length]
+
+
+class FakeCollection:
+    def __init__(self, docs=()):
+        self.docs = {doc["_id"]: copy.deepcopy(doc) for doc in docs}
+
+    def find(self, query, projection=None):
+        return FakeCursor([copy.deepcopy(d) for d in self.docs.values() if matches(d, query)])
+
+    async def find_one(self, query):
+        for doc in self.docs.values():
+            if matches(doc, query):
+                return copy.deepcopy(doc)
+        return None
+
+    async def count_documents(self, query):
+        return sum(1 for d in self.docs.values() if matches(d, query))
+
+    async def insert_one(self, doc):
+        self.docs[doc["_id"]] = copy.deepcopy(doc)
+
+    async def update_one(self, query, update):
+        for doc in self.docs.values():
+            if matches(doc, query):
+                apply_update(doc, update)
+                return SimpleNamespace(matched_count=1, modified_count=1)
+        return SimpleNamespace(matched_count=0, modified_count=0)
+
+    async def update_many(self, query, update):
+        count = 0
+        for doc in self.docs.values():
+            if matches(doc, query):
+                apply_update(doc, update)
+                count += 1
+        return SimpleNamespace(matched_count=count, modified_count=count)
+
+    async def find_one_and_update(self, query, update, return_document=False, session=None):
+        for doc in self.docs.values():
+            if matches(doc, query):
+                before = copy.deepcopy(doc)
+                apply_update(doc, update)
+                return copy.deepcopy(doc) if return_document else before
+        return None
@@ -0,0 +1,196 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+import inventory
+from inventory import (
+    InsufficientStock,
+    InvalidItems,
+    ReservationLimitExceeded,
+    cancel_reservation,
+    clear_reservation_holds,
+    commit_reservation,
+    create_reservation,
+    release_expired_reservations,
+    release_stock,
+    reserve_stock,
+)
+from fake_mongo import FakeCollection
+
+SHIRT = ObjectId()
+JEANS = ObjectId()
+SOCKS = ObjectId()
+
+
+def _products():
+    return FakeCollection([
+        {"_id": SHIRT, "name": "Shirt", "sizes": ["S", "M"], "stock": {"S": 5, "M": 1}},
+        {"_id": JEANS, "name": "Jeans", "sizes": ["32"], "stock": {"32": 3}},
+        {"_id": SOCKS, "name": "Socks", "sizes": ["Free"], "stock": None},
+    ])
+
+
+def _item(product_id, size, quantity=1):
+    return {"productId": str(product_id), "selectedSize": size, "quantity": quantity}
+
+
+def _stock(products, product_id):
+    return products.docs[product_id]["stock"]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_reserve_takes_every_item_and_marks_holds():
+    products = _products()
+    reserved = run(reserve_stock(products, "RES1", [_item(SHIRT, "S", 2), _item(JEANS, "32"), _item(SHIRT, "S")]))
+
+    assert sorted((r["productId"], r["quantity"]) for r in reserved) == sorted([(str(SHIRT), 3), (str(JEANS), 1)])
+    assert _stock(products, SHIRT)["S"] == 2
+    assert _stock(products, JEANS)["32"] == 2
+    assert products.docs[SHIRT]["holds"]["RES1"]["S"] == 3
+
+
+def test_short_item_gives_back_the_others():
+    products = _products()
+    with pytest.raises(InsufficientStock) as e:
+        run(reserve_stock(products, "RES1", [_item(SHIRT, "S", 2), _item(SHIRT, "M", 2), _item(JEANS, "32")]))
+
+    assert e.value.items == [_item(SHIRT, "M", 2)]
+    assert _stock(products, SHIRT) == {"S": 5, "M": 1}
+    assert _stock(products, JEANS) == {"32": 3}
+    assert not products.docs[SHIRT].get("holds", {}).get("RES1")
+
+
+def test_failed_write_is_compensated_and_reraised():
+    class FlakyProducts(FakeCollection):
+        async def update_one(self, query, update):
+            if query.get("_id") == JEANS and "$inc" in update and update["$inc"].get("stock.32", 0) < 0:
+                raise RuntimeError("write failed")
+            return await super().update_one(query, update)
+
+    products = FlakyProducts(_products().docs.values())
+    with pytest.raises(RuntimeError):
+        run(reserve_stock(products, "RES1", [_item(SHIRT, "S"), _item(JEANS, "32")]))
+    assert _stock(products, SHIRT)["S"] == 5
+
+
+@pytest.mark.parametrize("item", [
+    _item(ObjectId(), "S"),
+    _item("not-an-id", "S"),
+    _item(SHIRT, "XL"),
+    _item(SHIRT, ""),
+    _item(SHIRT, "S", 0),
+    _item(SHIRT, "S", -1000),
+    _item(SHIRT, "S", inventory.MAX_UNITS_PER_ITEM + 1),
+])
+def test_invalid_items_are_rejected_before_touching_stock(item):
+    products = _products()
+    with pytest.raises(InvalidItems):
+        run(reserve_stock(products, "RES1", [item]))
+    assert _stock(products, SHIRT) == {"S": 5, "M": 1}
+
+
+def test_untracked_products_are_skipped():
+    products = _products()
+    assert run(reserve_stock(products, "RES1", [_item(SOCKS, "Free", 3)])) == []
+
+
+def test_release_is_idempotent():
+    products = _products()
+    items = [_item(SHIRT, "S", 2)]
+    run(reserve_stock(products, "RES1", items))
+    run(release_stock(products, "RES1", items))
+    run(release_stock(products, "RES1", items))
+    assert _stock(products, SHIRT)["S"] == 5
+
+
+def test_release_never_returns_stock_another_reservation_holds():
+    products = _products()
+    run(reserve_stock(products, "RES1", [_item(SHIRT, "S", 2)]))
+    run(release_stock(products, "RES2", [_item(SHIRT, "S", 2)]))
+    assert _stock(products, SHIRT)["S"] == 3
+
+
+def test_reservation_is_held_and_committed():
+    products, reservations = _products(), FakeCollection()
+    reservation = run(create_reservation(products, reservations, "u1", [_item(SHIRT, "S")]))
+    assert reservations.docs[reservation["_id"]]["status"] == "held"
+
+    assert run(commit_reservation(reservations, reservation["_id"], "u1"))
+    run(clear_reservation_holds(products, reservations, reservation["_id"]))
+    assert _stock(products, SHIRT)["S"] == 4
+    assert reservation["_id"] not in products.docs[SHIRT].get("holds", {})
+
+
+def test_failed_reservation_is_marked_released():
+    products, reservations = _products(), FakeCollection()
+    with pytest.raises(InsufficientStock):
+        run(create_reservation(products, reservations, "u1", [_item(SHIRT, "M", 2)]))
+    assert [r["status"] for r in reservations.docs.values()] == ["released"]
+
+
+def test_active_reservations_per_user_are_capped():
+    products, reservations = _products(), FakeCollection()
+    for _ in range(inventory.MAX_ACTIVE_RESERVATIONS):
+        run(create_reservation(products, reservations, "u1", [_item(SHIRT, "S")]))
+    with pytest.raises(ReservationLimitExceeded):
+        run(create_reservation(products, reservations, "u1", [_item(SHIRT, "S")]))
+    run(create_reservation(products, reservations, "u2", [_item(SHIRT, "S")]))
+
+
+def test_cancelled_reservation_cannot_be_committed():
+    products, reservations = _products(), FakeCollection()
+    reservation = run(create_reservation(products, reservations, "u1", [_item(SHIRT, "S")]))
+    assert run(cancel_reservation(products, reservations, {"_id": reservation["_id"], "userId": "u1"}))
+    assert run(commit_reservation(reservations, reservation["_id"], "u1")) is None
+    assert _stock(products, SHIRT)["S"] == 5
+    assert reservations.docs[reservation["_id"]]["status"] == "released"
+
+
+def test_sweeper_releases_expired_and_unfinished_reservations():
+    products, reservations = _products(), FakeCollection()
+    expired = run(create_reservation(products, reservations, "u1", [_item(SHIRT, "S", 2)], ttl=timedelta(0)))
+    live = run(create_reservation(products, reservations, "u2", [_item(JEANS, "32")]))
+    committed = run(create_reservation(products, reservations, "u3", [_item(SHIRT, "M")]))
+    run(commit_reservation(reservations, committed["_id"], "u3"))
+
+    # A pending reservation whose process died after taking stock.
+    run(reserve_stock(products, "RESCRASH", [_item(SHIRT, "S")]))
+    reservations.docs["RESCRASH"] = {
+        "_id": "RESCRASH",
+        "userId": "u4",
+        "items": [_item(SHIRT, "S")],
+        "status": "releasing",
+        "releasingAt": datetime.utcnow() - timedelta(minutes=5),
+        "expiresAt": datetime.utcnow() - timedelta(minutes=5),
+    }
+
+    assert run(release_expired_reservations(products, reservations)) == 2
+    assert reservations.docs[expired["_id"]]["status"] == "released"
+    assert reservations.docs["RESCRASH"]["status"] == "released"
+    assert reservations.docs[live["_id"]]["status"] == "held"
+    assert reservations.docs[committed["_id"]]["status"] == "committed"
+    assert _stock(products, SHIRT) == {"S": 5, "M": 0}
+    assert _stock(products, JEANS) == {"32": 2}
+
+
+def test_concurrent_reservations_never_oversell():
+    async def scenario():
+        products, reservations = _products(), FakeCollection()
+        outcomes = await asyncio.gather(
+            *(create_reservation(products, reservations, f"u{n}", [_item(SHIRT, "S"), _item(JEANS, "32")])
+              for n in range(10)),
+            return_exceptions=True,
+        )
+        return products, outcomes
+
+    products, outcomes = run(scenario())
+    held = [o for o in outcomes if isinstance(o, dict)]
+    assert len(held) == 3
+    assert all(isinstance(o, InsufficientStock) for o in outcomes if not isinstance(o, dict))
+    assert _stock(products, JEANS)["32"] == 0
+    assert _stock(products, SHIRT)["S"] == 2
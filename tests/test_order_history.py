@@ -0,0 +1,31 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from order_history import decode_order_cursor, encode_order_cursor, order_cursor_query
+
+
+def test_cursor_round_trip():
+    order = {"_id": ObjectId(), "createdAt": datetime(2026, 5, 1, 12, 30, 15, 250000)}
+    assert decode_order_cursor(encode_order_cursor(order)) == (order["createdAt"], order["_id"])
+
+
+def test_cursor_for_order_without_created_at():
+    order = {"_id": ObjectId()}
+    created_at, order_oid = decode_order_cursor(encode_order_cursor(order))
+    assert created_at is None
+    assert order_oid == order["_id"]
+    assert order_cursor_query(created_at, order_oid) == {"createdAt": None, "_id": {"$lt": order_oid}}
+
+
+def test_dated_cursor_still_reaches_undated_orders():
+    oid = ObjectId()
+    query = order_cursor_query(datetime(2026, 5, 1), oid)
+    assert {"createdAt": None} in query["$or"]
+
+
+@pytest.mark.parametrize("cursor", ["garbage", "2026-05-01T00:00:00_nothex", "notadate_" + str(ObjectId())])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_order_cursor(cursor)
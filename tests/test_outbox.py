@@ -0,0 +1,118 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from outbox import OutboxWorker, outbox_event
+
+
+class FakeCollection:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.writes = []
+
+    async def bulk_write(self, ops, ordered=True):
+        if self.fail:
+            raise RuntimeError("write failed")
+        self.writes.extend(ops)
+
+
+def _event(attempts=0, event_type="order.created"):
+    event = outbox_event(event_type, {"orderId": "ORD1", "userId": "u1"})
+    event.update({"_id": ObjectId(), "attempts": attempts, "claimToken": "token"})
+    return event
+
+
+def _set(op):
+    return op._doc["$set"]
+
+
+def test_success_marks_event_done():
+    worker = OutboxWorker(FakeCollection())
+    op, outcome = worker._result_update(_event(), None)
+    assert outcome == "processed"
+    assert _set(op)["status"] == "done"
+    assert op._filter == {"_id": op._filter["_id"], "claimToken": "token"}
+
+
+@pytest.mark.parametrize("attempts, delay", [(0, 2), (1, 4), (2, 8), (5, 64)])
+def test_failure_backs_off_exponentially(attempts, delay):
+    worker = OutboxWorker(FakeCollection(), base_backoff=2.0, max_backoff=600.0)
+    before = datetime.utcnow()
+    op, outcome = worker._result_update(_event(attempts), "boom")
+
+    assert outcome == "retried"
+    assert _set(op)["status"] == "pending"
+    assert _set(op)["attempts"] == attempts + 1
+    wait = _set(op)["availableAt"] - before
+    assert timedelta(seconds=delay) <= wait < timedelta(seconds=delay + 1)
+
+
+def test_backoff_is_capped():
+    worker = OutboxWorker(FakeCollection(), base_backoff=2.0, max_backoff=30.0, max_attempts=20)
+    before = datetime.utcnow()
+    op, _ = worker._result_update(_event(10), "boom")
+    assert _set(op)["availableAt"] - before < timedelta(seconds=31)
+
+
+def test_last_attempt_dead_letters_event():
+    worker = OutboxWorker(FakeCollection(), max_attempts=3)
+    op, outcome = worker._result_update(_event(2), "boom")
+    assert outcome == "failed"
+    assert _set(op)["status"] == "failed"
+    assert _set(op)["lastError"] == "boom"
+
+
+def test_handler_timeout_must_be_shorter_than_lease():
+    with pytest.raises(ValueError):
+        OutboxWorker(FakeCollection(), lease=timedelta(seconds=30), handler_timeout=30)
+
+
+def test_process_batch_counts_outcomes():
+    async def run():
+        collection = FakeCollection()
+        worker = OutboxWorker(collection)
+
+        async def handler(payload):
+            if payload["orderId"] == "bad":
+                raise ValueError("bad order")
+
+        worker.register("order.created", handler)
+        bad = _event()
+        bad["payload"]["orderId"] = "bad"
+        await worker._process_batch([_event(), bad, _event(event_type="unknown")])
+        return worker, collection
+
+    worker, collection = asyncio.run(run())
+    assert len(collection.writes) == 3
+    assert (worker.processed, worker.retried, worker.failed) == (1, 2, 0)
+
+
+def test_counters_untouched_when_result_write_fails():
+    async def run():
+        worker = OutboxWorker(FakeCollection(fail=True))
+
+        async def handler(payload):
+            pass
+
+        worker.register("order.created", handler)
+        with pytest.raises(RuntimeError):
+            await worker._process_batch([_event()])
+        return worker
+
+    worker = asyncio.run(run())
+    assert (worker.processed, worker.retried, worker.failed) == (0, 0, 0)
+
+
+def test_hung_handler_times_out():
+    async def run():
+        worker = OutboxWorker(FakeCollection(), handler_timeout=0.05)
+
+        async def handler(payload):
+            await asyncio.sleep(10)
+
+        worker.register("order.created", handler)
+        return await worker._handle(_event())
+
+    assert "timed out" in asyncio.run(run())
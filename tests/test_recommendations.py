@@ -0,0 +1,107 @@
+import numpy as np
+
+from recommendations import (
+    build_feature_matrix,
+    category_groups,
+    merge_related,
+    top_k_neighbors,
+)
+
+
+def _product(category, fabric="Cotton", price=999.0, colors=("Black",), sizes=("M",)):
+    return {
+        "category": category,
+        "fabric": fabric,
+        "colors": list(colors),
+        "sizes": list(sizes),
+        "price": price,
+        "rating": 4.0,
+        "discount": 20,
+    }
+
+
+def _catalog(n=60, seed=0):
+    rng = np.random.default_rng(seed)
+    categories = ["Shirts", "Jeans", "Jackets"]
+    fabrics = ["Cotton", "Denim", "Linen", "Wool"]
+    colors = ["Black", "White", "Blue", "Red", "Green"]
+    return [
+        _product(
+            categories[rng.integers(len(categories))],
+            fabrics[rng.integers(len(fabrics))],
+            float(rng.uniform(300, 5000)),
+            rng.choice(colors, 2, replace=False),
+            rng.choice(["S", "M", "L", "XL"], 2, replace=False),
+        )
+        for _ in range(n)
+    ]
+
+
+def test_feature_rows_are_unit_length():
+    matrix = build_feature_matrix(_catalog())
+    assert np.allclose(np.linalg.norm(matrix, axis=1), 1.0, atol=1e-5)
+
+
+def test_top_k_matches_brute_force():
+    matrix = build_feature_matrix(_catalog())
+    indices, scores = top_k_neighbors(matrix, k=5)
+
+    sims = matrix @ matrix.T
+    np.fill_diagonal(sims, -np.inf)
+    expected = -np.sort(-sims, axis=1)[:, :5]
+
+    assert np.allclose(scores, expected, atol=1e-5)
+    assert not (indices == np.arange(len(matrix))[:, None]).any()
+    assert (np.diff(scores, axis=1) <= 0).all()
+
+
+def test_top_k_for_subset_of_rows():
+    matrix = build_feature_matrix(_catalog())
+    rows = np.array([3, 17, 42])
+    full_indices, full_scores = top_k_neighbors(matrix, k=4)
+    indices, scores = top_k_neighbors(matrix, rows, k=4)
+    assert np.allclose(scores, full_scores[rows])
+
+
+def test_grouped_search_stays_in_category():
+    products = _catalog()
+    matrix = build_feature_matrix(products)
+    groups = category_groups(products)
+    indices, _ = top_k_neighbors(matrix, k=5, groups=groups)
+    assert (groups[indices] == groups[:, None]).all()
+
+
+def test_small_category_searches_whole_catalog():
+    products = _catalog(30) + [_product("Socks")]
+    matrix = build_feature_matrix(products)
+    groups = category_groups(products)
+    indices, scores = top_k_neighbors(matrix, np.array([30]), k=5, groups=groups)
+    assert indices.shape == (1, 5)
+    assert np.isfinite(scores).all()
+
+
+def test_k_is_capped_by_catalog_size():
+    matrix = build_feature_matrix(_catalog(3))
+    indices, _ = top_k_neighbors(matrix, k=8)
+    assert indices.shape == (3, 2)
+
+
+def test_merge_related_replaces_changed_and_drops_deleted():
+    stored = [
+        {"productId": "a", "score": 0.9},
+        {"productId": "b", "score": 0.8},
+        {"productId": "gone", "score": 0.7},
+        {"productId": "c", "score": 0.6},
+    ]
+    merged = merge_related(stored, {"b", "d"}, {"b": 0.5, "d": 0.95}, {"a", "b", "c", "d"}, k=3)
+    assert merged == [
+        {"productId": "d", "score": 0.95},
+        {"productId": "a", "score": 0.9},
+        {"productId": "c", "score": 0.6},
+    ]
+
+
+def test_merge_related_drops_changed_product_that_left_the_pool():
+    stored = [{"productId": "a", "score": 0.9}, {"productId": "b", "score": 0.8}]
+    merged = merge_related(stored, {"a"}, {}, {"a", "b"}, k=3)
+    assert merged == [{"productId": "b", "score": 0.8}]